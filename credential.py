@@ -5,15 +5,17 @@ QQ音乐凭证管理工具
 """
 
 import asyncio
-import pickle
 import json
+import pickle
+import orjson
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Any
 from datetime import datetime
 from qqmusic_api.login import get_qrcode, check_qrcode, QRLoginType, Credential, QRCodeLoginEvents, check_expired
 
 # 配置
-CREDENTIAL_FILE = Path("qqmusic_cred.pkl")
+CREDENTIAL_FILE = Path("qqmusic_cred.json")
+LEGACY_CREDENTIAL_FILE = Path("qqmusic_cred.pkl")  # 旧版凭证文件(仅用于迁移)
 
 
 class CredentialManager:
@@ -23,14 +25,60 @@ class CredentialManager:
         self.credential_file = credential_file
         self.credential = None
 
+    # 凭证持久化字段及默认值
+    FIELDS = {
+        'openid': '', 'refresh_token': '', 'access_token': '', 'expired_at': 0,
+        'musicid': 0, 'musickey': '', 'unionid': '', 'str_musicid': '',
+        'refresh_key': '', 'encrypt_uin': '', 'login_type': 2,
+    }
+
+    @classmethod
+    def _to_dict(cls, cred: Credential) -> Dict[str, Any]:
+        """凭证转换为可JSON序列化的字典"""
+        data = {key: getattr(cred, key, default) for key, default in cls.FIELDS.items()}
+        # 额外字段(如 musickeyCreateTime/keyExpiresIn)用于判断凭证是否过期，需一并保存
+        data['extra_fields'] = dict(getattr(cred, 'extra_fields', None) or {})
+        return data
+
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any]) -> Credential:
+        """由字典构建凭证，缺失字段使用默认值"""
+        return Credential(**{key: data.get(key, default) for key, default in cls.FIELDS.items()},
+                          extra_fields=dict(data.get('extra_fields') or {}))
+
+    def _migrate_legacy_file(self) -> Optional[Credential]:
+        """将旧版pickle凭证文件一次性迁移为JSON，返回读取到的旧版凭证(迁移失败时仍可直接使用)"""
+        if self.credential_file.exists() or not LEGACY_CREDENTIAL_FILE.exists():
+            return None
+
+        try:
+            data = LEGACY_CREDENTIAL_FILE.read_bytes()
+            try:
+                cred = self._from_dict(orjson.loads(data))
+            except orjson.JSONDecodeError:
+                # 旧版本使用pickle保存，仅读取本程序自己生成的文件
+                cred = pickle.loads(data)
+        except Exception as e:
+            print(f"读取旧版凭证失败: {e}")
+            return None
+
+        try:
+            self.credential_file.write_bytes(orjson.dumps(self._to_dict(cred)))
+            LEGACY_CREDENTIAL_FILE.unlink()
+            print(f"已将旧版凭证迁移至: {self.credential_file}")
+        except Exception as e:
+            print(f"旧版凭证迁移失败: {e}")
+        return cred
+
     def load_credential(self) -> Optional[Credential]:
         """加载本地凭证"""
-        if not self.credential_file.exists():
+        # 旧版凭证迁移失败(如目录不可写)时直接使用读取到的凭证，无需重新登录
+        legacy_cred = self._migrate_legacy_file()
+        if not self.credential_file.exists() and not legacy_cred:
             return None
 
         try:
-            with self.credential_file.open("rb") as f:
-                cred = pickle.load(f)
+            cred = legacy_cred or self._from_dict(orjson.loads(self.credential_file.read_bytes()))
             self.credential = cred
             return cred
         except Exception as e:
@@ -44,8 +92,7 @@ class CredentialManager:
             return False
 
         try:
-            with self.credential_file.open("wb") as f:
-                pickle.dump(self.credential, f)
+            self.credential_file.write_bytes(orjson.dumps(self._to_dict(self.credential)))
             print("凭证已保存")
             return True
         except Exception as e:
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 
 import asyncio
+import functools
+import os
 import pickle
+from collections import OrderedDict
+import random
+import re
 import aiohttp
-import aiofiles
+import orjson
 from pathlib import Path
-from typing import Optional, Literal, Dict, Any, List, Tuple
+from typing import Optional, Literal, Dict, Any, List, Tuple, Callable, Awaitable, Hashable
 import logging
 import sys
 from dataclasses import dataclass
 from contextlib import asynccontextmanager
+from concurrent.futures import Executor
 
 from qqmusic_api import search
 from qqmusic_api.song import get_song_urls, SongFileType
@@ -23,9 +29,20 @@ from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC, USLT
 class Config:
     COVER_SIZE = 800 #封面尺寸[150, 300, 500, 800]
     DOWNLOAD_TIMEOUT = 30
-    CREDENTIAL_FILE = Path("qqmusic_cred.pkl")
+    RATE_PER_SEC = 8  #每秒平均请求数
+    RATE_BURST = 4  #允许的突发请求数
+    CREDENTIAL_FILE = Path("qqmusic_cred.json")  #凭证文件
+    LEGACY_CREDENTIAL_FILE = Path("qqmusic_cred.pkl")  #旧版凭证文件(仅用于迁移)
     MUSIC_DIR = Path("./music")
     MIN_FILE_SIZE = 1024
+    CHUNK_SIZE = 64 * 1024  #下载分块大小
+    WRITE_BUFFER_SIZE = 1024 * 1024  #累积到该大小后写入磁盘
+    MAX_RETRIES = 3  #请求最大尝试次数
+    RETRY_BASE_DELAY = 0.5  #重试退避基数(秒)
+    CONNECTION_LIMIT = 32  #连接池总连接数
+    CONNECTIONS_PER_HOST = 8  #单主机最大连接数
+    DNS_CACHE_TTL = 300  #DNS缓存时间(秒)
+    KEEPALIVE_TIMEOUT = 60  #空闲连接保持时间(秒)
     SEARCH_RESULTS_COUNT = 5  #搜索结果数量
     EXTERNAL_API_URL = "https://api.ygking.top"  # 外部API地址
 
@@ -45,7 +62,19 @@ setup_logging()
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+## 事件循环配置
+def setup_event_loop():
+    """非Windows平台下优先使用uvloop(可选依赖)"""
+    if sys.platform == 'win32':
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+@dataclass(slots=True)
 class SongInfo:
     """歌曲信息数据类"""
     name: str
@@ -66,24 +95,126 @@ class MetadataError(Exception):
     pass
 
 
+class RateLimiter:
+    """令牌桶限速器，平均每秒 rate 个请求，空闲后允许最多 burst 个请求连续发出"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取得一个令牌，令牌不足时等待补充"""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                self._tokens = 1.0
+                self._updated = loop.time()
+            self._tokens -= 1
+
+
 class NetworkManager:
     """网络请求管理器"""
 
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    MAX_RETRY_DELAY = 8
+    _CONTENT_RANGE_RE = re.compile(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)')
+
     def __init__(self):
         self.session = None
+        self.rate_limiter = RateLimiter(Config.RATE_PER_SEC, Config.RATE_BURST)
+
+    @staticmethod
+    def parse_content_range(response: aiohttp.ClientResponse) -> Tuple[Optional[int], Optional[int]]:
+        """解析Content-Range头，返回(起始位置, 文件总大小)，缺失或未知时为None"""
+        match = NetworkManager._CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if not match:
+            return None, None
+        start, total = match.groups()
+        return (int(start) if start else None,
+                int(total) if total != '*' else None)
 
     @asynccontextmanager
     async def get_session(self):
         """获取会话的上下文管理器"""
         if self.session is None:
-            timeout = aiohttp.ClientTimeout(total=Config.DOWNLOAD_TIMEOUT)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            # 不限制总时长，大文件只要持续有数据就不会被中断；连接和读取分别超时
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=Config.DOWNLOAD_TIMEOUT,
+                                            sock_read=Config.DOWNLOAD_TIMEOUT)
+            # 保持长连接，封面和音频请求复用同一主机的TLS连接
+            connector = aiohttp.TCPConnector(
+                limit=Config.CONNECTION_LIMIT,
+                limit_per_host=Config.CONNECTIONS_PER_HOST,
+                ttl_dns_cache=Config.DNS_CACHE_TTL,
+                keepalive_timeout=Config.KEEPALIVE_TIMEOUT,
+                force_close=False
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
 
         try:
             yield self.session
         except Exception as e:
             raise DownloadError(f"网络请求失败: {e}")
 
+    @asynccontextmanager
+    async def get_with_retry(self, url: str, *, headers: Optional[Dict[str, str]] = None,
+                             max_attempts: int = Config.MAX_RETRIES,
+                             base: float = Config.RETRY_BASE_DELAY):
+        """发起GET请求，遇到429/5xx或网络异常时按指数退避重试"""
+        async with self.get_session() as session:
+            for attempt in range(max_attempts):
+                is_last = attempt == max_attempts - 1
+                await self.rate_limiter.acquire()
+                try:
+                    response = await session.get(url, headers=headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if is_last:
+                        raise
+                    logger.debug(f"请求异常，准备重试 ({attempt + 1}/{max_attempts}): {e}, URL: {url}")
+                    await asyncio.sleep(self._backoff_delay(attempt, base))
+                    continue
+
+                if response.status in self.RETRY_STATUSES and not is_last:
+                    delay = self._retry_after(response) or self._backoff_delay(attempt, base)
+                    response.release()
+                    logger.debug(f"状态码 {response.status}，{delay:.2f}s 后重试: {url}")
+                    await asyncio.sleep(delay)
+                    continue
+
+                try:
+                    yield response
+                finally:
+                    response.release()
+                return
+
+    async def probe(self, url: str) -> Tuple[int, Optional[int]]:
+        """发送HEAD请求，返回(状态码, Content-Length)
+
+        仅用于探测封面CDN上的静态图片，不占用接口限流名额，同一首歌的候选URL可真正并发探测
+        """
+        async with self.get_session() as session:
+            async with session.head(url, allow_redirects=True) as resp:
+                return resp.status, resp.content_length
+
+    def _backoff_delay(self, attempt: int, base: float) -> float:
+        """计算指数退避时间"""
+        return min(base * 2 ** attempt + random.random() * 0.1, self.MAX_RETRY_DELAY)
+
+    def _retry_after(self, response: aiohttp.ClientResponse) -> Optional[float]:
+        """解析Retry-After响应头(秒)"""
+        value = response.headers.get('Retry-After')
+        if value and value.isdigit():
+            return min(float(value), self.MAX_RETRY_DELAY)
+        return None
+
     async def close(self):
         """关闭会话"""
         if self.session:
@@ -94,13 +225,13 @@ class NetworkManager:
 class FileManager:
     """文件管理类"""
 
+    # 文件名非法字符替换表
+    _TRANSLATE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
     @staticmethod
     def sanitize_filename(filename: str) -> str:
         """清理文件名中的非法字符"""
-        illegal_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
-        for char in illegal_chars:
-            filename = filename.replace(char, '_')
-        return filename.strip()
+        return filename.translate(FileManager._TRANSLATE).strip()
 
     @staticmethod
     def ensure_directory(path: Path) -> Path:
@@ -108,183 +239,285 @@ class FileManager:
         path.mkdir(parents=True, exist_ok=True)
         return path
 
+    @staticmethod
+    def is_nonempty_file(path: str) -> bool:
+        """文件存在且非空(只做一次 stat)"""
+        try:
+            return os.stat(path).st_size > 0
+        except OSError:
+            return False
+
 
 class CoverManager:
     """封面管理类"""
 
+    VALID_SIZES = frozenset({150, 300, 500, 800})
+    # 逗号分隔VS值中的片段(去除空白)
+    _VS_TOKEN_RE = re.compile(r'[^,\s]{3,}')
+
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def get_cover_url_by_album_mid(mid: str, size: Literal[150, 300, 500, 800] = 800) -> Optional[str]:
         """通过专辑MID获取封面URL"""
         if not mid:
             return None
-        if size not in [150, 300, 500, 800]:
+        if size not in CoverManager.VALID_SIZES:
             raise ValueError("不支持的封面尺寸")
         return f"https://y.gtimg.cn/music/photo_new/T002R{size}x{size}M000{mid}.jpg"
 
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def get_cover_url_by_vs(vs: str, size: Literal[150, 300, 500, 800] = 800) -> Optional[str]:
         """通过VS值获取封面URL"""
         if not vs:
             return None
-        if size not in [150, 300, 500, 800]:
+        if size not in CoverManager.VALID_SIZES:
             raise ValueError("不支持的封面尺寸")
         return f"https://y.qq.com/music/photo_new/T062R{size}x{size}M000{vs}.jpg"
 
+    @staticmethod
+    def detect_mime(data: bytes) -> Optional[str]:
+        """根据文件头判断图片MIME类型，无法识别时返回None"""
+        if data[:3] == b'\xff\xd8\xff':
+            return 'image/jpeg'
+        if data[:4] == b'\x89PNG':
+            return 'image/png'
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return 'image/webp'
+        return None
+
     @staticmethod
     async def get_valid_cover_url(song_data: Dict[str, Any], network: NetworkManager,
-                                  size: Literal[150, 300, 500, 800] = 800) -> Optional[str]:
-        """获取并验证有效的封面URL（按优先级尝试所有可能的VS值）"""
+                                  size: Literal[150, 300, 500, 800] = 800) -> Optional[Tuple[str, bytes, str]]:
+        """获取有效的封面（并发探测所有候选URL，按优先级下载第一个可用的）
+
+        返回 (封面URL, 图片数据, MIME类型)
+        """
         # 1. 优先尝试专辑MID
+        candidates = []
         album_mid = song_data.get('album', {}).get('mid', '')
         if album_mid:
-            url = CoverManager.get_cover_url_by_album_mid(album_mid, size)
-            logger.debug(f"尝试专辑MID封面: {url}")
-            cover_data = await CoverManager.download_cover(url, network)
-            if cover_data:
-                logger.info(f"使用专辑MID封面: {url}")
-                return url
+            candidates.append((CoverManager.get_cover_url_by_album_mid(album_mid, size), 'album_mid'))
 
         # 2. 尝试所有可用的VS值（按顺序）
         vs_values = song_data.get('vs', [])
         logger.debug(f"分析VS值: {vs_values}")
 
-        # 收集所有候选VS值
-        candidate_vs = []
-
-        # 首先收集所有单个有效的VS值
-        for i, vs in enumerate(vs_values):
-            if vs and isinstance(vs, str) and len(vs) >= 3 and ',' not in vs:
-                candidate_vs.append({
-                    'value': vs,
-                    'source': f'vs_single_{i}',
-                    'priority': 1  # 高优先级
-                })
-
-        # 然后收集逗号分隔的VS值部分
-        for i, vs in enumerate(vs_values):
-            if vs and ',' in vs:
-                parts = [part.strip() for part in vs.split(',') if part.strip()]
-                for j, part in enumerate(parts):
-                    if len(part) >= 3:
-                        candidate_vs.append({
-                            'value': part,
-                            'source': f'vs_part_{i}_{j}',
-                            'priority': 2  # 中优先级
-                        })
-
-        # 按优先级排序
-        candidate_vs.sort(key=lambda x: x['priority'])
-
-        logger.debug(f"候选VS值: {[c['value'] for c in candidate_vs]}")
-
-        # 按顺序尝试每个候选VS值
-        for candidate in candidate_vs:
-            url = CoverManager.get_cover_url_by_vs(candidate['value'], size)
-            logger.debug(f"尝试VS值封面 [{candidate['source']}]: {url}")
-            cover_data = await CoverManager.download_cover(url, network)
-            if cover_data:
-                logger.info(f"使用VS值封面 [{candidate['source']}]: {url}")
-                return url
+        # 先取单个有效的VS值，再取逗号分隔VS值中长度>=3的片段，去重并保持该优先顺序
+        str_values = [vs for vs in vs_values if isinstance(vs, str)]
+        singles = [vs for vs in str_values if len(vs) >= 3 and ',' not in vs]
+        parts = CoverManager._VS_TOKEN_RE.findall(','.join(vs for vs in str_values if ',' in vs))
+        candidate_vs = list(dict.fromkeys(singles + parts))
+
+        logger.debug(f"候选VS值: {candidate_vs}")
+        candidates.extend(
+            (CoverManager.get_cover_url_by_vs(vs, size), f'vs_{i}') for i, vs in enumerate(candidate_vs)
+        )
+
+        # 并发HEAD探测所有候选URL，只下载探测通过的
+        probes = await asyncio.gather(
+            *[network.probe(url) for url, _ in candidates], return_exceptions=True
+        )
+        for (url, source), probe in zip(candidates, probes):
+            if isinstance(probe, BaseException):
+                logger.debug(f"封面探测异常 [{source}]: {probe}, URL: {url}")
+                continue
+            status, content_length = probe
+            # 部分CDN的HEAD响应不带Content-Length，交由下载时校验
+            if status != 200 or (content_length is not None and content_length <= Config.MIN_FILE_SIZE):
+                continue
+
+            cover = await CoverManager.download_cover(url, network)
+            if cover:
+                logger.info(f"使用封面 [{source}]: {url}")
+                return url, *cover
 
         logger.warning("未找到任何有效的封面URL")
         return None
 
     @staticmethod
-    async def download_cover(url: str, network: NetworkManager) -> Optional[bytes]:
-        """下载封面图片"""
+    async def download_cover(url: str, network: NetworkManager) -> Optional[Tuple[bytes, str]]:
+        """下载封面图片，返回(图片数据, 按文件头识别的MIME类型)"""
         if not url:
             return None
 
         try:
-            async with network.get_session() as session:
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        # 检查文件大小和内容有效性
-                        if len(content) > Config.MIN_FILE_SIZE:
-                            # 简单验证图片格式
-                            if content.startswith(b'\xff\xd8') or content.startswith(b'\x89PNG'):
-                                logger.debug(f"封面下载成功: {len(content)} bytes")
-                                return content
-                            else:
-                                logger.warning(f"封面图片格式无效: {url}")
+            async with network.get_with_retry(url) as resp:
+                if resp.status == 200:
+                    content = await resp.read()
+                    # 检查文件大小和内容有效性
+                    if len(content) > Config.MIN_FILE_SIZE:
+                        # 按文件头验证图片格式，同时得到MIME类型
+                        mime = CoverManager.detect_mime(content)
+                        if mime:
+                            logger.debug(f"封面下载成功: {len(content)} bytes")
+                            return content, mime
                         else:
-                            logger.warning(f"封面图片过小: {len(content)} bytes, URL: {url}")
+                            logger.warning(f"封面图片格式无效: {url}")
                     else:
-                        return None
+                        logger.warning(f"封面图片过小: {len(content)} bytes, URL: {url}")
+                else:
                     return None
+                return None
         except Exception as e:
             logger.error(f"封面下载异常: {e}, URL: {url}")
             return None
 
 
-class MetadataManager:
-    """元数据管理类"""
+class CoverCache:
+    """封面LRU缓存(按专辑)，同一专辑的并发请求只下载一次"""
 
-    def __init__(self, network: NetworkManager):
-        self.network = network
+    MAX = 128
 
-    async def add_metadata_to_flac(self, file_path: Path, song_info: SongInfo,
-                                   lyrics_data: dict = None, song_data: Dict[str, Any] = None) -> bool:
-        """为FLAC文件添加元数据"""
+    def __init__(self):
+        self._cache: OrderedDict[Hashable, Tuple[bytes, str]] = OrderedDict()
+        # 正在加载的专辑 -> 加载结果，同一专辑的其他请求直接等待该结果
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable,
+                  loader: Callable[[], Awaitable[Optional[Tuple[bytes, str]]]]) -> Optional[Tuple[bytes, str]]:
+        """获取缓存的封面，未命中时调用loader加载"""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            # shield: 等待方被取消时不影响其他等待同一结果的任务
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        value = None
         try:
-            audio = FLAC(file_path)
+            value = await loader()
+            # 获取失败(可能只是超时等临时错误)不缓存，同专辑的后续歌曲会重新获取
+            if value is not None:
+                self._cache[key] = value
+                if len(self._cache) > self.MAX:
+                    self._cache.popitem(last=False)
+            return value
+        finally:
+            # 无论成功、失败或取消，都唤醒等待者并移除记录
+            del self._pending[key]
+            future.set_result(value)
 
-            # 设置基本元数据
-            self._set_basic_metadata(audio, song_info)
 
-            # 添加封面
-            if song_data:
-                await self._add_cover_to_flac(audio, song_data)
+class MetadataManager:
+    """元数据管理类"""
 
-            # 添加歌词
-            if lyrics_data:
-                self._add_lyrics_to_flac(audio, lyrics_data)
+    def __init__(self, network: NetworkManager, cover_cache: Optional[CoverCache] = None,
+                 executor: Optional[Executor] = None):
+        self.network = network
+        self.cover_cache = cover_cache
+        # 标签读写使用的线程池，未指定时使用事件循环默认线程池
+        self.executor = executor
 
-            audio.save()
-            return True
+    async def add_metadata_to_flac(self, file_path: Path, song_info: SongInfo,
+                                   lyrics_data: dict = None,
+                                   cover: Optional[Tuple[bytes, str]] = None) -> bool:
+        """为FLAC文件添加元数据(cover 为调用方获取的 (封面数据, MIME类型))"""
+        try:
+            # 文件读写交给线程池，避免阻塞事件循环
+            return await self.run_blocking(self._write_flac_tags, file_path, song_info, cover, lyrics_data)
 
         except Exception as e:
             logger.error(f"FLAC元数据添加失败: {e}")
             raise MetadataError(f"FLAC元数据处理失败: {e}")
 
     async def add_metadata_to_mp3(self, file_path: Path, song_info: SongInfo,
-                                  lyrics_data: dict = None, song_data: Dict[str, Any] = None) -> bool:
-        """为MP3文件添加元数据"""
+                                  lyrics_data: dict = None,
+                                  cover: Optional[Tuple[bytes, str]] = None) -> bool:
+        """为MP3文件添加元数据(cover 为调用方获取的 (封面数据, MIME类型))"""
         try:
-            # 确保文件存在且可读
-            if not file_path.exists():
-                logger.error(f"文件不存在: {file_path}")
-                return False
+            return await self.run_blocking(self._write_mp3_tags, file_path, song_info, cover, lyrics_data)
 
-            # 尝试读取现有ID3标签，如果不存在则创建新的
-            try:
-                audio = ID3(file_path)
-            except Exception:
-                audio = ID3()
+        except Exception as e:
+            logger.error(f"MP3元数据添加失败: {e}")
+            raise MetadataError(f"MP3元数据处理失败: {e}")
 
-            # 清除现有的封面和歌词标签
-            self._clear_existing_mp3_tags(audio)
+    async def run_blocking(self, func: Callable, *args):
+        """在线程池中执行同步的文件读写"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
 
-            # 设置基本元数据
-            self._set_basic_metadata_mp3(audio, song_info)
+    async def fetch_cover(self, song_data: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+        """获取封面图片数据及MIME类型(按专辑缓存在 cover_cache 中)"""
+        key = self._cover_cache_key(song_data)
+        if self.cover_cache and key:
+            return await self.cover_cache.get(key, lambda: self._load_cover(song_data))
+        return await self._load_cover(song_data)
 
-            # 添加封面
-            if song_data:
-                await self._add_cover_to_mp3(audio, song_data)
+    @staticmethod
+    def _cover_cache_key(song_data: Dict[str, Any]) -> Optional[Hashable]:
+        """封面缓存键：优先专辑MID，否则使用VS值"""
+        album_mid = song_data.get('album', {}).get('mid', '')
+        if album_mid:
+            return album_mid, Config.COVER_SIZE
+        vs_values = tuple(vs.strip() for vs in song_data.get('vs', []) if isinstance(vs, str) and vs.strip())
+        if vs_values:
+            return vs_values, Config.COVER_SIZE
+        return None
 
-            # 添加歌词
-            if lyrics_data:
-                self._add_lyrics_to_mp3(audio, lyrics_data)
+    async def _load_cover(self, song_data: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+        """探测并下载封面"""
+        result = await CoverManager.get_valid_cover_url(song_data, self.network, Config.COVER_SIZE)
+        if not result:
+            return None
+        _, cover_data, mime = result
+        return cover_data, mime
+
+    def _write_flac_tags(self, file_path: Path, song_info: SongInfo,
+                         cover: Optional[Tuple[bytes, str]], lyrics_data: Optional[dict]) -> bool:
+        """写入FLAC标签(同步，在线程中执行)"""
+        audio = FLAC(file_path)
+
+        # 设置基本元数据
+        self._set_basic_metadata(audio, song_info)
+
+        # 添加封面
+        if cover:
+            self._add_cover_to_flac(audio, *cover)
+
+        # 添加歌词
+        if lyrics_data:
+            self._add_lyrics_to_flac(audio, lyrics_data)
+
+        audio.save()
+        return True
+
+    def _write_mp3_tags(self, file_path: Path, song_info: SongInfo,
+                        cover: Optional[Tuple[bytes, str]], lyrics_data: Optional[dict]) -> bool:
+        """写入MP3标签(同步，在线程中执行)"""
+        # 确保文件存在且可读
+        if not file_path.exists():
+            logger.error(f"文件不存在: {file_path}")
+            return False
 
-            # 保存标签
-            audio.save(file_path, v2_version=3)  # 使用ID3v2.3确保兼容性
-            logger.debug(f"MP3元数据添加成功: {file_path}")
-            return True
+        # 尝试读取现有ID3标签，如果不存在则创建新的
+        try:
+            audio = ID3(file_path, v2_version=3)
+        except Exception:
+            audio = ID3()
 
-        except Exception as e:
-            logger.error(f"MP3元数据添加失败: {e}")
-            raise MetadataError(f"MP3元数据处理失败: {e}")
+        # 清除现有的封面和歌词标签
+        self._clear_existing_mp3_tags(audio)
+
+        # 设置基本元数据
+        self._set_basic_metadata_mp3(audio, song_info)
+
+        # 添加封面
+        if cover:
+            self._add_cover_to_mp3(audio, *cover)
+
+        # 添加歌词
+        if lyrics_data:
+            self._add_lyrics_to_mp3(audio, lyrics_data)
+
+        # 保存标签
+        audio.save(file_path, v2_version=3)  # 使用ID3v2.3确保兼容性
+        logger.debug(f"MP3元数据添加成功: {file_path}")
+        return True
 
     def _clear_existing_mp3_tags(self, audio):
         """清除现有的MP3标签"""
@@ -309,48 +542,29 @@ class MetadataManager:
         except Exception as e:
             logger.error(f"设置MP3基本元数据失败: {e}")
 
-    async def _add_cover_to_flac(self, audio, song_data: Dict[str, Any]):
+    def _add_cover_to_flac(self, audio, cover_data: bytes, mime: str):
         """为FLAC添加封面"""
-        cover_url = await CoverManager.get_valid_cover_url(song_data, self.network, Config.COVER_SIZE)
-        if cover_url:
-            cover_data = await CoverManager.download_cover(cover_url, self.network)
-            if cover_data:
-                image = Picture()
-                image.type = 3
-                # 根据URL判断图片类型
-                if cover_url.lower().endswith('.png'):
-                    image.mime = 'image/png'
-                else:
-                    image.mime = 'image/jpeg'
-                image.desc = 'Cover'
-                image.data = cover_data
+        image = Picture()
+        image.type = 3
+        image.mime = mime
+        image.desc = 'Cover'
+        image.data = cover_data
 
-                audio.clear_pictures()
-                audio.add_picture(image)
-                logger.info("FLAC封面添加成功")
+        audio.clear_pictures()
+        audio.add_picture(image)
+        logger.info("FLAC封面添加成功")
 
-    async def _add_cover_to_mp3(self, audio, song_data: Dict[str, Any]):
+    def _add_cover_to_mp3(self, audio, cover_data: bytes, mime: str):
         """为MP3添加封面"""
         try:
-            cover_url = await CoverManager.get_valid_cover_url(song_data, self.network, Config.COVER_SIZE)
-            if cover_url:
-                cover_data = await CoverManager.download_cover(cover_url, self.network)
-                if cover_data:
-                    # 检测图片类型
-                    if cover_url.lower().endswith('.png'):
-                        mime_type = 'image/png'
-                    else:
-                        mime_type = 'image/jpeg'
-
-                    # 添加封面图片
-                    audio.add(APIC(
-                        encoding=3,  # UTF-8
-                        mime=mime_type,
-                        type=3,  # 封面图片
-                        desc='Cover',
-                        data=cover_data
-                    ))
-                    logger.info("MP3封面添加成功")
+            audio.add(APIC(
+                encoding=3,  # UTF-8
+                mime=mime,
+                type=3,  # 封面图片
+                desc='Cover',
+                data=cover_data
+            ))
+            logger.info("MP3封面添加成功")
         except Exception as e:
             logger.error(f"添加MP3封面失败: {e}")
 
@@ -380,24 +594,78 @@ class CredentialManager:
     """凭证管理器"""
 
     def __init__(self, credential_file: Path = Config.CREDENTIAL_FILE, 
-                 external_api_url: str = Config.EXTERNAL_API_URL):
+                 external_api_url: str = Config.EXTERNAL_API_URL,
+                 network: Optional[NetworkManager] = None):
         self.credential_file = credential_file
+        # 与下载器共用连接池，外部API请求无需重新建立连接
+        self.network = network or NetworkManager()
         self.external_api_url = external_api_url.rstrip('/') if external_api_url else ""
         self.credential_loaded = False
         self.credential_refreshed = False
         self.loaded_from_api = False
 
+    # 凭证持久化字段及默认值(与外部API返回的字段一致)
+    FIELDS = {
+        'openid': '', 'refresh_token': '', 'access_token': '', 'expired_at': 0,
+        'musicid': 0, 'musickey': '', 'unionid': '', 'str_musicid': '',
+        'refresh_key': '', 'encrypt_uin': '', 'login_type': 2,
+    }
+
+    @classmethod
+    def _to_dict(cls, cred: Credential) -> Dict[str, Any]:
+        """凭证转换为可JSON序列化的字典"""
+        data = {key: getattr(cred, key, default) for key, default in cls.FIELDS.items()}
+        # 额外字段(如 musickeyCreateTime/keyExpiresIn)用于判断凭证是否过期，需一并保存
+        data['extra_fields'] = dict(getattr(cred, 'extra_fields', None) or {})
+        return data
+
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any]) -> Credential:
+        """由字典构建凭证，缺失字段使用默认值"""
+        return Credential(**{key: data.get(key, default) for key, default in cls.FIELDS.items()},
+                          extra_fields=dict(data.get('extra_fields') or {}))
+
+    def _save_credential(self, cred: Credential):
+        """保存凭证到JSON文件"""
+        self.credential_file.write_bytes(orjson.dumps(self._to_dict(cred)))
+
+    def _migrate_legacy_file(self) -> Optional[Credential]:
+        """将旧版pickle凭证文件一次性迁移为JSON，返回读取到的旧版凭证(迁移失败时仍可直接使用)"""
+        legacy_file = Config.LEGACY_CREDENTIAL_FILE
+        if self.credential_file.exists() or not legacy_file.exists():
+            return None
+
+        try:
+            data = legacy_file.read_bytes()
+            try:
+                cred = self._from_dict(orjson.loads(data))
+            except orjson.JSONDecodeError:
+                # 旧版本使用pickle保存，仅读取本程序自己生成的文件
+                cred = pickle.loads(data)
+        except Exception as e:
+            logger.warning(f"读取旧版凭证失败: {e}")
+            return None
+
+        try:
+            self._save_credential(cred)
+            legacy_file.unlink()
+        except Exception as e:
+            logger.warning(f"旧版凭证迁移失败: {e}")
+        return cred
+
     async def load_and_refresh_credential(self) -> Optional[Credential]:
         """加载并刷新凭证"""
         self.credential_loaded = False
         self.credential_refreshed = False
         self.loaded_from_api = False
 
+        # 旧版凭证迁移失败(如目录不可写)时直接使用读取到的凭证，无需重新登录
+        legacy_cred = self._migrate_legacy_file()
+
         # 优先尝试从本地文件加载
-        if self.credential_file.exists():
+        if self.credential_file.exists() or legacy_cred:
             try:
-                with self.credential_file.open("rb") as f:
-                    cred: Credential = pickle.load(f)
+                cred = legacy_cred or self._from_dict(orjson.loads(self.credential_file.read_bytes()))
 
                 if await check_expired(cred):
                     refreshed_cred = await self._refresh_credential(cred)
@@ -445,10 +713,10 @@ class CredentialManager:
         
         try:
             timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
+            async with self.network.get_session() as session:
+                async with session.get(url, timeout=timeout) as response:
                     if response.status == 200:
-                        data = await response.json()
+                        data = await response.json(loads=orjson.loads)
                         cred_data = data.get('credential', {})
                         
                         if not cred_data or not cred_data.get('musicid') or not cred_data.get('musickey'):
@@ -456,27 +724,19 @@ class CredentialManager:
                             return None
                         
                         # 构建Credential对象
-                        cred = Credential(
-                            openid=cred_data.get('openid', ''),
-                            refresh_token=cred_data.get('refresh_token', ''),
-                            access_token=cred_data.get('access_token', ''),
-                            expired_at=cred_data.get('expired_at', 0),
-                            musicid=cred_data.get('musicid', 0),
-                            musickey=cred_data.get('musickey', ''),
-                            unionid=cred_data.get('unionid', ''),
-                            str_musicid=cred_data.get('str_musicid', ''),
-                            refresh_key=cred_data.get('refresh_key', ''),
-                            encrypt_uin=cred_data.get('encrypt_uin', ''),
-                            login_type=cred_data.get('login_type', 2)
-                        )
+                        cred = self._from_dict(cred_data)
                         
                         logger.info(f"成功从外部API加载凭证: {self.external_api_url}")
                         return cred
                     else:
                         logger.warning(f"外部API返回错误状态码: {response.status}")
                         return None
-        except asyncio.TimeoutError:
-            logger.error(f"从外部API加载凭证超时: {self.external_api_url}")
+        except DownloadError as e:
+            # 超时等网络异常均由 get_session 包装为 DownloadError
+            if isinstance(e.__context__, asyncio.TimeoutError):
+                logger.error(f"从外部API加载凭证超时: {self.external_api_url}")
+            else:
+                logger.error(f"从外部API加载凭证失败: {e}")
             return None
         except Exception as e:
             logger.error(f"从外部API加载凭证失败: {e}")
@@ -487,8 +747,7 @@ class CredentialManager:
         if await cred.can_refresh():
             try:
                 await cred.refresh()
-                with self.credential_file.open("wb") as f:
-                    pickle.dump(cred, f)
+                self._save_credential(cred)
                 self.credential_refreshed = True
                 return cred
             except Exception as e:
@@ -503,12 +762,15 @@ class QQMusicSingleDownloader:
         self.download_dir = FileManager.ensure_directory(download_dir)
         self.credential = None
         self.quality_level = 3  # 默认 FLAC 无损
+        # 音质策略缓存(按音质等级)
+        self._strategy_cache: Dict[int, Tuple[Tuple[SongFileType, str], ...]] = {}
 
         # 初始化组件
         self.network = NetworkManager()
         self.file_manager = FileManager()
-        self.credential_manager = CredentialManager()
-        self.metadata_manager = MetadataManager(self.network)
+        self.credential_manager = CredentialManager(network=self.network)
+        self.cover_cache = CoverCache()
+        self.metadata_manager = MetadataManager(self.network, self.cover_cache)
 
     async def initialize(self):
         """初始化下载器"""
@@ -550,7 +812,11 @@ class QQMusicSingleDownloader:
             raise DownloadError(f"搜索失败: {e}")
 
     def extract_song_info(self, song_data: Dict[str, Any]) -> SongInfo:
-        """提取歌曲信息"""
+        """提取歌曲信息(结果缓存在song_data中，预览和下载共用)"""
+        cached = song_data.get('_song_info')
+        if cached is not None:
+            return cached
+
         song_name = song_data.get('title', '未知歌曲')
 
         singer_info = song_data.get('singer', [])
@@ -558,7 +824,7 @@ class QQMusicSingleDownloader:
                        if singer_info and isinstance(singer_info, list)
                        else '未知歌手')
 
-        return SongInfo(
+        song_info = SongInfo(
             name=song_name,
             singer=singer_name,
             mid=song_data.get('mid', ''),
@@ -566,6 +832,8 @@ class QQMusicSingleDownloader:
             album_name=song_data.get('album', {}).get('name', ''),
             album_mid=song_data.get('album', {}).get('mid', '')
         )
+        song_data['_song_info'] = song_info
+        return song_info
 
     # 音质选项: (显示名称, 降级链)
     QUALITY_OPTIONS = {
@@ -595,13 +863,17 @@ class QQMusicSingleDownloader:
         ]),
     }
 
-    def _get_quality_strategy(self) -> List[Tuple[SongFileType, str]]:
-        """获取音质下载策略"""
-        _, fallback_chain = self.QUALITY_OPTIONS.get(self.quality_level, self.QUALITY_OPTIONS[3])
-        return fallback_chain
+    def _get_quality_strategy(self) -> Tuple[Tuple[SongFileType, str], ...]:
+        """获取音质下载策略(按当前音质等级缓存)"""
+        strategy = self._strategy_cache.get(self.quality_level)
+        if strategy is None:
+            _, fallback_chain = self.QUALITY_OPTIONS.get(self.quality_level, self.QUALITY_OPTIONS[3])
+            strategy = self._strategy_cache[self.quality_level] = tuple(fallback_chain)
+        return strategy
 
     async def download_song(self, song_data: Dict[str, Any]) -> bool:
         """下载单首歌曲"""
+        extras = None
         try:
             song_info = self.extract_song_info(song_data)
 
@@ -613,16 +885,24 @@ class QQMusicSingleDownloader:
                 f"{song_info.singer} - {song_info.name}"
             )
 
+            # 循环内使用字符串路径，只在真正下载时构造Path
+            download_dir_str = os.fspath(self.download_dir)
+
             # 尝试不同音质
             for file_type, quality_name in self._get_quality_strategy():
-                file_path = self.download_dir / f"{safe_filename}{file_type.e}"
+                file_name = f"{safe_filename}{file_type.e}"
+                file_path_str = os.path.join(download_dir_str, file_name)
 
-                if file_path.exists():
-                    print(f"文件已存在，跳过: {file_path.name}")
+                if FileManager.is_nonempty_file(file_path_str):
+                    print(f"文件已存在，跳过: {file_name}")
                     return True
 
+                if extras is None:
+                    # 歌词与封面和音质无关，与音频下载同时获取
+                    extras = asyncio.create_task(self._fetch_extras(song_info, song_data))
+
                 success = await self._download_with_quality(
-                    song_info, file_type, quality_name, file_path, song_data
+                    song_info, file_type, quality_name, Path(file_path_str), song_data, extras
                 )
                 if success:
                     return True
@@ -634,11 +914,17 @@ class QQMusicSingleDownloader:
             logger.error(f"下载歌曲失败: {e}")
             return False
 
+        finally:
+            if extras is not None and not extras.done():
+                extras.cancel()
+
     async def _download_with_quality(self, song_info: SongInfo, file_type: SongFileType,
-                                     quality_name: str, file_path: Path, song_data: Dict[str, Any]) -> bool:
+                                     quality_name: str, file_path: Path, song_data: Dict[str, Any],
+                                     extras: Optional[asyncio.Task] = None) -> bool:
         """使用指定音质下载"""
         print(f"尝试下载 {quality_name}: {song_info.singer} - {song_info.name}{' [VIP]' if song_info.is_vip else ''}")
 
+        await self.network.rate_limiter.acquire()
         urls = await get_song_urls([song_info.mid], file_type=file_type,
                                    credential=self.credential)
         url = urls.get(song_info.mid)
@@ -647,47 +933,123 @@ class QQMusicSingleDownloader:
             print(f"无法获取歌曲URL ({quality_name})")
             return False
 
-        async with self.network.get_session() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    content = await response.read()
-                    if len(content) > Config.MIN_FILE_SIZE:
-                        await self._save_file(file_path, content)
-                        await self._add_metadata(file_path, song_info, song_data)
-                        print(f"下载成功: ---> {file_path.name}")
-                        return True
-                    else:
-                        print("文件过小，可能下载失败")
-                else:
-                    print(f"下载失败，状态码: {response.status}")
+        # 先写入临时文件，中断后可通过Range续传；文件名包含音质代码，
+        # 同为 .flac 的不同音质不会续传到彼此的临时文件上
+        part_path = file_path.with_name(f"{file_path.name}.{file_type.s}.part")
+        existing = part_path.stat().st_size if part_path.exists() else 0
+        headers = {'Range': f'bytes={existing}-'} if existing else None
+
+        async with self.network.get_with_retry(url, headers=headers) as response:
+            range_start, range_total = NetworkManager.parse_content_range(response)
+            if response.status == 206 and existing and range_start != existing:
+                # 服务器返回的续传起点与本地临时文件不一致，不能追加写入
+                restart = True
+            elif response.status in (200, 206):
+                restart = False
+                # 206 表示续传成功，追加写入；200 表示从头下载，覆盖临时文件
+                resume = response.status == 206
+                offset = existing if resume else 0
+
+                # 根据Content-Length提前放弃明显异常的响应，避免无意义的写入
+                if response.content_length is not None and offset + response.content_length <= Config.MIN_FILE_SIZE:
+                    print("文件过小，可能下载失败")
+                    return False
+
+                size = offset + await self._save_stream(part_path, response, append=resume)
+            elif response.status == 416 and existing and range_total == existing:
+                # 临时文件已完整(上次在写入标签或重命名前中断)，直接完成
+                restart = False
+                size = existing
+            elif response.status == 416:
+                # 续传范围无效，丢弃临时文件以便下次重新下载
+                part_path.unlink(missing_ok=True)
+                print(f"续传失败，已清除临时文件: {part_path.name}")
+                return False
+            else:
+                print(f"下载失败，状态码: {response.status}")
+                return False
 
+        if restart:
+            # 丢弃临时文件后从头下载(不再带Range，不会再次进入此分支)
+            part_path.unlink(missing_ok=True)
+            print(f"续传位置不一致，重新下载: {part_path.name}")
+            return await self._download_with_quality(song_info, file_type, quality_name, file_path,
+                                                     song_data, extras)
+
+        if size > Config.MIN_FILE_SIZE:
+            # 在临时文件上写入标签后再重命名，最终文件只落盘一次
+            await self._add_metadata(part_path, song_info, song_data, file_type.e, extras)
+            part_path.replace(file_path)
+            print(f"下载成功: ---> {file_path.name}")
+            return True
+
+        part_path.unlink(missing_ok=True)
+        print("文件过小，可能下载失败")
         return False
 
-    async def _save_file(self, file_path: Path, content: bytes):
-        """保存文件"""
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+    async def _save_stream(self, file_path: Path, response: aiohttp.ClientResponse,
+                           append: bool = False) -> int:
+        """分块接收响应内容，攒满缓冲区后在线程中写入文件，返回本次写入的字节数"""
+        total = 0
+        buffer = bytearray()
+        f = await asyncio.to_thread(open, file_path, 'ab' if append else 'wb')
+        try:
+            async for chunk in response.content.iter_chunked(Config.CHUNK_SIZE):
+                buffer += chunk
+                total += len(chunk)
+                if len(buffer) >= Config.WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(f.write, buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, buffer)
+        finally:
+            await asyncio.to_thread(f.close)
+        return total
+
+    # 文件扩展名 -> MetadataManager 中对应的标签写入方法
+    _TAG_DISPATCH = {
+        '.flac': 'add_metadata_to_flac',
+        '.mp3': 'add_metadata_to_mp3',
+        '.m4a': 'add_metadata_to_mp3',
+    }
 
-    async def _add_metadata(self, file_path: Path, song_info: SongInfo, song_data: Dict[str, Any]):
-        """添加元数据"""
+    async def _add_metadata(self, file_path: Path, song_info: SongInfo, song_data: Dict[str, Any],
+                            suffix: Optional[str] = None, extras: Optional[asyncio.Task] = None):
+        """添加元数据(suffix 为最终文件扩展名，默认取 file_path 的扩展名；extras 为预取歌词与封面的任务)"""
         try:
-            lyrics_data = await self._get_lyrics(song_info.mid)
+            suffix = (suffix or file_path.suffix).lower()
+            handler_name = self._TAG_DISPATCH.get(suffix)
+            if not handler_name:
+                return
+
+            # 歌词与封面只获取一次，再交给对应格式的标签写入
+            if extras is not None:
+                lyrics_data, cover = await extras
+            else:
+                lyrics_data, cover = await self._fetch_extras(song_info, song_data)
 
-            if file_path.suffix.lower() == '.flac':
-                await self.metadata_manager.add_metadata_to_flac(
-                    file_path, song_info, lyrics_data, song_data
-                )
-            elif file_path.suffix.lower() in ['.mp3', '.m4a']:
-                await self.metadata_manager.add_metadata_to_mp3(
-                    file_path, song_info, lyrics_data, song_data
-                )
+            await getattr(self.metadata_manager, handler_name)(
+                file_path, song_info, lyrics_data, cover
+            )
 
         except Exception as e:
             logger.warning(f"元数据添加失败: {e}")
 
+    async def _fetch_extras(self, song_info: SongInfo,
+                            song_data: Dict[str, Any]) -> Tuple[Optional[dict], Optional[Tuple[bytes, str]]]:
+        """并发获取歌词与封面，任一失败时对应结果为None"""
+        lyrics_data, cover = await asyncio.gather(
+            self._get_lyrics(song_info.mid),
+            self.metadata_manager.fetch_cover(song_data),
+            return_exceptions=True
+        )
+        return (None if isinstance(lyrics_data, BaseException) else lyrics_data,
+                None if isinstance(cover, BaseException) else cover)
+
     async def _get_lyrics(self, song_mid: str) -> Optional[dict]:
         """获取歌词"""
         try:
+            await self.network.rate_limiter.acquire()
             return await get_lyric(song_mid)
         except Exception:
             return None
@@ -840,6 +1202,7 @@ async def main():
 
 
 if __name__ == "__main__":
+    setup_event_loop()
     try:
         asyncio.run(main())
     except KeyboardInterrupt: